@@ -1,9 +1,14 @@
 import streamlit as st
 import streamlit.components.v1 as components
 import json
-import random
 import os
 
+from game_data import DATA_FILE, get_pack_pool
+from poem_index import build_char_index
+from question_gen import QuestionGenerator
+from session_store import current_session_id, get_session_store
+from telemetry import collect_answers
+
 # ==========================================
 # 1. 基础配置
 # ==========================================
@@ -28,48 +33,97 @@ st.markdown("""
 # ==========================================
 # 2. 用户登录逻辑
 # ==========================================
+# 每次 rerun 都记一次活跃；本局题包存在会话仓库里，空闲超时后由后台回收
+sessions = get_session_store()
+session_id = current_session_id()
+was_reaped = sessions.touch(session_id)
+
+GAME_MODES = {"接句": "jieju", "填字": "tianzi", "混合": "mixed"}
+QUESTION_COUNTS = [10, 20, 30, 50, 100, 200, 300, 500]
+
 if 'current_user' not in st.session_state:
     st.session_state.current_user = None
+if 'game_mode' not in st.session_state:
+    st.session_state.game_mode = "jieju"
+if 'question_count' not in st.session_state:
+    st.session_state.question_count = 30
 
 if not st.session_state.current_user:
+    # 登录页就把题包池建好，玩家填名字的工夫后台已在备题
+    if os.path.exists(DATA_FILE):
+        get_pack_pool(DATA_FILE, os.path.getmtime(DATA_FILE))
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         st.markdown("<br><br><br>", unsafe_allow_html=True)
         st.title("📜 青庭诗词大会")
         st.info("请留下大侠尊姓大名，即可开启挑战。")
         user_input = st.text_input("大侠尊姓大名：", placeholder="李太白")
+        mode_label = st.radio("题型：", list(GAME_MODES), horizontal=True,
+                              help="接句：选上一句/下一句；填字：补全诗句中缺失的一个字")
+        question_count = st.select_slider("题量：", options=QUESTION_COUNTS, value=30,
+                                          help="100 题以上为马拉松模式")
         if st.button("开始挑战", type="primary", use_container_width=True):
             if user_input.strip():
                 st.session_state.current_user = user_input
+                st.session_state.game_mode = GAME_MODES[mode_label]
+                st.session_state.question_count = question_count
+                sessions.discard(session_id, "pack_json")
                 st.rerun()
             else:
                 st.error("请务必输入名字！")
     st.stop()
 
 current_user_name = st.session_state.current_user
+game_mode = st.session_state.game_mode
+question_count = st.session_state.question_count
 
 # ==========================================
 # 3. 数据准备
 # ==========================================
-data_file = 'app_data.json'
-poets_data = []
+data_file = DATA_FILE
 
 if not os.path.exists(data_file):
     poets_data = [
-        {"名字": "测试诗", "作者": "系统", "朝代": "唐", "content_1": "请先上传app_data.json", "content_2": "才能看到真实数据", "content_3": "床前明月光", "content_4": "疑是地上霜", "备注": ""}
-    ] * 10
+        {"名字": "测试诗", "作者": "系统", "朝代": "唐", "content_1": "请先上传app_data.json", "content_2": "才能看到真实数据", "content_3": "床前明月光", "content_4": "疑是地上霜", "备注": ""},
+        {"名字": "静夜思", "作者": "李白", "朝代": "唐", "content_1": "床前明月光，疑是地上霜。", "content_2": "举头望明月，低头思故乡。", "备注": ""},
+        {"名字": "春晓", "作者": "孟浩然", "朝代": "唐", "content_1": "春眠不觉晓，处处闻啼鸟。", "content_2": "夜来风雨声，花落知多少。", "备注": ""},
+        {"名字": "登鹳雀楼", "作者": "王之涣", "朝代": "唐", "content_1": "白日依山尽，黄河入海流。", "content_2": "欲穷千里目，更上一层楼。", "备注": ""},
+        {"名字": "相思", "作者": "王维", "朝代": "唐", "content_1": "红豆生南国，春来发几枝。", "content_2": "愿君多采撷，此物最相思。", "备注": ""},
+        {"名字": "江雪", "作者": "柳宗元", "朝代": "唐", "content_1": "千山鸟飞绝，万径人踪灭。", "content_2": "孤舟蓑笠翁，独钓寒江雪。", "备注": ""},
+        {"名字": "鹿柴", "作者": "王维", "朝代": "唐", "content_1": "空山不见人，但闻人语响。", "content_2": "返景入深林，复照青苔上。", "备注": ""},
+    ]
+    take_pack = QuestionGenerator(poets_data, build_char_index(poets_data)).make_pack
     st.toast("⚠️ 提示：使用测试数据中，请上传 app_data.json", icon="⚠️")
 else:
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            poets_data = json.load(f)
-        if len(poets_data) > 1000:
-            poets_data = random.sample(poets_data, 1000)
+        take_pack = get_pack_pool(data_file, os.path.getmtime(data_file)).take
     except Exception as e:
         st.error(f"数据读取失败: {e}")
         st.stop()
 
-poets_json = json.dumps(poets_data, ensure_ascii=False)
+# 前端“再来一局”经上报通道请求换一套题
+batch = collect_answers()
+if batch and batch.get("restart"):
+    sessions.discard(session_id, "pack_json")
+if batch and batch.get("finished"):
+    sessions.set_in_game(session_id, False)
+
+# 整套题从预生成题包池中取出并固定在会话仓库中：埋点上报触发的 rerun 不会换题，游戏页也不会重载
+pack_json = sessions.get(session_id, "pack_json")
+if pack_json is None:
+    pack = take_pack(question_count, game_mode)
+    pack_json = json.dumps(pack, ensure_ascii=False)
+    # 超出单会话内存上限时从末尾裁题，直到能存下为止：本局必须固定住，否则每次 rerun 都会换题
+    trimmed = False
+    while not sessions.put(session_id, "pack_json", pack_json, len(pack_json.encode('utf-8'))) and pack:
+        pack = pack[:len(pack) * 9 // 10]
+        pack_json = json.dumps(pack, ensure_ascii=False)
+        trimmed = True
+    sessions.set_in_game(session_id, True)
+    if trimmed:
+        st.toast(f"⚠️ 题量超出单会话内存上限，本局缩减为 {len(pack)} 题", icon="⚠️")
+    if was_reaped:
+        st.toast("⏰ 长时间未操作，上一局已被回收，已为你换上一套新题", icon="⏰")
 
 # ==========================================
 # 4. 前端代码块
@@ -127,6 +181,7 @@ html_code = f"""
         .option-tag {{ width: 22px; height: 22px; border-radius: 50%; background: #333; color: white; text-align: center; margin-right: 10px; flex-shrink: 0; line-height: 22px; font-size: 0.8rem; }}
         .option-btn.correct {{ background: #e8f5e9; border-color: var(--accent-green); color: var(--accent-green); }}
         .option-btn.wrong {{ background: #ffebee; border-color: var(--accent-red); color: var(--accent-red); }}
+        .option-btn.hidden {{ display: none; }}
         
         .control-bar {{ padding: 10px 15px; background: #f4f4f4; display: flex; justify-content: space-around; border-top: 1px solid #ccc; }}
         .ctrl-btn {{ padding: 8px 18px; background: var(--ink-black); color: white; border: none; border-radius: 5px; cursor: pointer; font-size: 0.95rem; }}
@@ -154,7 +209,12 @@ html_code = f"""
         .review-controls h3 {{ margin: 0; font-size: 1.1rem; color: #333; }}
         .review-controls .ctrl-btn {{ font-size: 0.85rem; padding: 6px 15px; }}
         
-        .review-item {{ border-bottom: 1px dashed #ccc; padding: 8px 0; text-align: left; font-size: 0.9rem; }}
+        /* 复盘列表只渲染可视区附近的行，行高固定，超长诗句省略显示 */
+        .review-viewport {{ max-height: 50vh; overflow-y: auto; position: relative; }}
+        .review-item {{ border-bottom: 1px dashed #ccc; padding: 8px 0; text-align: left; font-size: 0.9rem; height: 137px; overflow: hidden; }}
+        /* 每块固定折成至多两行（36 字的长句在窄屏上也放得下），行高 20px：3 块 × 2 行 × 20 + 上下内边距 16 + 边框 1 = 137 */
+        .review-item div {{ line-height: 20px; height: 40px; overflow: hidden; word-break: break-all;
+            display: -webkit-box; -webkit-line-clamp: 2; -webkit-box-orient: vertical; }}
         .review-wrong {{ color: var(--accent-red); text-decoration: line-through; }}
         .review-right {{ color: var(--accent-green); }}
     </style>
@@ -164,7 +224,7 @@ html_code = f"""
 <div class="app-container">
     <div class="status-bar">
         <div class="player-info">👤 {current_user_name}</div>
-        <div>得分: <span id="score" style="color:var(--accent-red)">0</span> / <span id="total-q">30</span></div>
+        <div>得分: <span id="score" style="color:var(--accent-red)">0</span> / <span id="total-q">{question_count}</span></div>
     </div>
     <div style="text-align:center; background:#eee; font-size:0.75rem; padding: 2px;" id="timer">00:00</div>
 
@@ -205,26 +265,35 @@ html_code = f"""
 
             <!-- === 修改处：复盘控制栏 (左右按钮，中间标题) === -->
             <div class="review-controls">
-                <button class="ctrl-btn" onclick="location.reload()" style="background:#555">↺ 再来一局</button>
+                <button class="ctrl-btn" onclick="restartGame()" style="background:#555">↺ 再来一局</button>
                 <h3>错题复盘</h3>
                 <button class="ctrl-btn review" onclick="closeModal()">关闭 ✕</button>
             </div>
             
-            <div id="review-list"></div>
+            <div id="review-list" class="review-viewport">
+                <div id="review-spacer"><div id="review-window"></div></div>
+            </div>
+            <div id="review-empty"></div>
         </div>
     </div>
 </div>
 
 <script>
-    const poetsDB = {poets_json};
-    const MAX_QUESTIONS = 30;
-    const MAX_LINES = 20; 
+    const questionPack = {pack_json};
+    const OPTION_TAGS = ['A','B','C','D'];
+    const REVIEW_ROW_H = 137;  // 与 .review-item 的 height 保持一致
+    const TELEMETRY_BATCH = 10;  // 攒满 10 条答题事件上报一次
     let clientIP = "未知";
 
+    // 待上报的答题事件：[句子ID, 题型, 所选项序号, 是否答对, 用时ms]
+    let telemetry = {{ queue: [], seq: 0, nonce: Date.now().toString(36) + Math.random().toString(36).slice(2, 6) }};
+
     let gameState = {{
         questions: [], currentIndex: 0, score: 0, 
         startTime: null, timerInterval: null, isFinished: false
     }};
+    let optionBtns = [];  // 四个选项按钮只建一次，换题时原地更新
+    let reviewRows = [];
 
     function fetchClientIP() {{
         fetch('https://api.ipify.org?format=json')
@@ -234,7 +303,13 @@ html_code = f"""
     }}
 
     function initGame() {{
-        generateQuestions();
+        buildOptionButtons();
+        gameState.questions = questionPack.map((q, i) => Object.assign(
+            {{ id: i, userChoice: null, userAnswer: null, isCorrect: false, shownAt: null }}, q));
+        if(gameState.questions.length === 0) {{
+            document.getElementById('question-text').innerText = "题库不足，无法出题";
+            return;
+        }}
         gameState.startTime = Date.now();
         gameState.timerInterval = setInterval(updateTimer, 1000);
         renderQuestion();
@@ -242,112 +317,97 @@ html_code = f"""
         fetchClientIP();
     }}
 
-    function getPoemLines(poem) {{
-        let lines = [];
-        for(let i=1; i<=MAX_LINES; i++) {{
-            let c = poem[`content_${{i}}`];
-            if(c && c.trim()) lines.push(c);
-        }}
-        return lines;
-    }}
-
-    function generateQuestions() {{
-        let qCount = 0, safety = 0;
-        while(qCount < MAX_QUESTIONS && safety < 3000) {{
-            safety++;
-            let pIdx = Math.floor(Math.random() * poetsDB.length);
-            let lines = getPoemLines(poetsDB[pIdx]);
-            if(lines.length < 2) continue;
-            
-            let lIdx = Math.floor(Math.random() * lines.length);
-            let qStr = lines[lIdx];
-            
-            let type = -1;
-            if (lIdx === 0) type = 1;
-            else if (lIdx === lines.length - 1) type = 0;
-            else type = Math.random() > 0.5 ? 1 : 0;
-            
-            let aStr = (type === 0) ? lines[lIdx - 1] : lines[lIdx + 1];
-            let hint = (type === 0) ? "选上一句" : "选下一句";
-            
-            let dists = [];
-            let sd = 0;
-            while(dists.length < 3 && sd < 100) {{
-                sd++;
-                let rp = poetsDB[Math.floor(Math.random()*poetsDB.length)];
-                let rLine = getPoemLines(rp)[0];
-                if(rLine !== aStr && rLine !== qStr && !dists.includes(rLine)) dists.push(rLine);
-            }}
-            
-            gameState.questions.push({{
-                id: qCount, poemIndex: pIdx, qStr, aStr, hint, 
-                options: [...dists, aStr].sort(()=>Math.random()-0.5), 
-                userAnswer: null, isCorrect: false
-            }});
-            qCount++;
-        }}
+    function buildOptionButtons() {{
+        let c = document.getElementById('options-container');
+        OPTION_TAGS.forEach((tag, i) => {{
+            let btn = document.createElement('div');
+            btn.className = 'option-btn';
+            btn.innerHTML = `<span class="option-tag">${{tag}}</span> <span class="option-text"></span>`;
+            btn.onclick = () => handleAnswer(i);
+            c.appendChild(btn);
+            optionBtns.push({{ btn, text: btn.querySelector('.option-text') }});
+        }});
     }}
 
     function renderQuestion() {{
         let q = gameState.questions[gameState.currentIndex];
-        let p = poetsDB[q.poemIndex];
         document.getElementById('question-text').innerText = q.qStr;
-        document.getElementById('question-type-hint').innerHTML = q.hint;
-        document.getElementById('meta-title').innerText = p["名字"];
-        document.getElementById('meta-author').innerText = p["作者"];
-        document.getElementById('meta-dynasty').innerText = p["朝代"];
+        document.getElementById('question-type-hint').innerText = q.hint;
+        document.getElementById('meta-title').innerText = q.title;
+        document.getElementById('meta-author').innerText = q.author;
+        document.getElementById('meta-dynasty').innerText = q.dynasty;
         document.getElementById('card').classList.remove('flipped');
+        if(q.userAnswer === null) q.shownAt = Date.now();
         
-        let c = document.getElementById('options-container');
-        c.innerHTML = "";
-        let abc = ['A','B','C','D'];
-        q.options.forEach((opt, i) => {{
-            let btn = document.createElement('div');
-            btn.className = 'option-btn';
-            btn.innerHTML = `<span class="option-tag">${{abc[i]}}</span> ${{opt}}`;
-            if(q.userAnswer !== null) {{
-                if(opt === q.aStr) btn.classList.add('correct');
-                else if(opt === q.userAnswer) btn.classList.add('wrong');
-                btn.style.pointerEvents = 'none';
-            }} else {{
-                btn.onclick = () => handleAnswer(opt, btn);
-            }}
-            c.appendChild(btn);
+        let answered = q.userChoice !== null;
+        optionBtns.forEach((o, i) => {{
+            let hasOpt = i < q.options.length;
+            o.btn.classList.toggle('hidden', !hasOpt);
+            o.text.textContent = hasOpt ? q.options[i] : "";
+            o.btn.classList.toggle('correct', answered && i === q.answerIdx);
+            o.btn.classList.toggle('wrong', answered && i === q.userChoice && i !== q.answerIdx);
+            o.btn.style.pointerEvents = answered ? 'none' : 'auto';
         }});
         
+        let total = gameState.questions.length;
         document.getElementById('btn-prev').disabled = (gameState.currentIndex === 0);
-        document.getElementById('btn-next').innerText = (gameState.currentIndex === MAX_QUESTIONS - 1) ? "交卷" : "下一题";
+        document.getElementById('btn-next').innerText = (gameState.currentIndex === total - 1) ? "交卷" : "下一题";
         updateStats();
     }}
 
-    function handleAnswer(opt, btn) {{
+    function handleAnswer(optIdx) {{
         if(gameState.isFinished) return;
         let q = gameState.questions[gameState.currentIndex];
-        q.userAnswer = opt;
-        q.isCorrect = (opt === q.aStr);
+        if(q.userChoice !== null) return;
+        q.userChoice = optIdx;
+        q.userAnswer = q.options[optIdx];
+        q.isCorrect = (optIdx === q.answerIdx);
+        recordAnswer(q, optIdx);
         if(q.isCorrect) {{
             gameState.score++;
-            btn.classList.add('correct');
         }} else {{
-            btn.classList.add('wrong');
+            optionBtns[optIdx].btn.classList.add('wrong');
             if(navigator.vibrate) navigator.vibrate(200);
-            document.querySelectorAll('.option-btn').forEach(b => {{
-                if(b.innerHTML.includes(q.aStr)) b.classList.add('correct');
-            }});
         }}
+        optionBtns[q.answerIdx].btn.classList.add('correct');
         updateStats();
-        document.querySelectorAll('.option-btn').forEach(b => b.style.pointerEvents = 'none');
+        optionBtns.forEach(o => o.btn.style.pointerEvents = 'none');
         setTimeout(() => {{
-            if(gameState.currentIndex < MAX_QUESTIONS - 1) {{
+            if(gameState.currentIndex < gameState.questions.length - 1) {{
                 gameState.currentIndex++;
                 renderQuestion();
             }} else finishGame();
         }}, 800);
     }}
 
+    function recordAnswer(q, optIdx) {{
+        telemetry.queue.push([q.lineId, q.kind, optIdx, q.isCorrect ? 1 : 0, Date.now() - q.shownAt]);
+        if(telemetry.queue.length >= TELEMETRY_BATCH) flushTelemetry();
+    }}
+
+    // 找到同页的上报桥接组件，整批转交；找不到时保留队列，下次再试
+    // flags 为附带给服务端的标记：restart 换一套题，finished 本局已交卷
+    function flushTelemetry(flags) {{
+        flags = flags || {{}};
+        if(telemetry.queue.length === 0 && !flags.restart && !flags.finished) return true;
+        let bridge = null;
+        try {{
+            bridge = Array.from(window.parent.document.querySelectorAll('iframe'))
+                .find(f => (f.src || '').includes('telemetry_bridge'));
+        }} catch(e) {{}}
+        if(!bridge) return false;
+        let batch = Object.assign({{ id: `${{telemetry.nonce}}-${{telemetry.seq++}}`, events: telemetry.queue }}, flags);
+        bridge.contentWindow.postMessage({{ type: 'poetry:answers', batch }}, '*');
+        telemetry.queue = [];
+        return true;
+    }}
+
+    // 请服务端换一套新题；通道不可用时退回为原题重开
+    function restartGame() {{ if(!flushTelemetry({{ restart: true }})) location.reload(); }}
+
     function updateStats() {{
         document.getElementById('score').innerText = gameState.score;
-        document.getElementById('total-q').innerText = MAX_QUESTIONS;
+        document.getElementById('total-q').innerText = gameState.questions.length;
     }}
     
     function updateTimer() {{
@@ -360,11 +420,12 @@ html_code = f"""
     
     function flipCard() {{ document.getElementById('card').classList.toggle('flipped'); }}
     function prevQuestion() {{ if(gameState.currentIndex>0){{ gameState.currentIndex--; renderQuestion(); }} }}
-    function nextQuestion() {{ if(gameState.currentIndex<MAX_QUESTIONS-1){{ gameState.currentIndex++; renderQuestion(); }} }}
+    function nextQuestion() {{ if(gameState.currentIndex<gameState.questions.length-1){{ gameState.currentIndex++; renderQuestion(); }} }}
 
     function finishGame() {{
         gameState.isFinished = true;
         clearInterval(gameState.timerInterval);
+        flushTelemetry({{ finished: true }});
         
         let now = new Date();
         let y = now.getFullYear(), mo = String(now.getMonth()+1).padStart(2,'0'), d = String(now.getDate()).padStart(2,'0');
@@ -375,26 +436,44 @@ html_code = f"""
         document.getElementById('final-time').innerText = document.getElementById('timer').innerText;
         document.getElementById('result-ip').innerText = clientIP;
         
+        reviewRows = [];
+        gameState.questions.forEach((q, i) => {{ if(!q.isCorrect) reviewRows.push(i); }});
         let list = document.getElementById('review-list');
-        list.innerHTML = "";
-        let wrong = 0;
-        gameState.questions.forEach((q, i) => {{
-            if(!q.isCorrect) {{
-                wrong++;
-                let item = document.createElement('div');
-                item.className = 'review-item';
-                let uAns = q.userAnswer ? q.userAnswer : "未作答";
-                item.innerHTML = `<div>${{i+1}}. ${{q.qStr}}</div><div style="font-size:0.9em">❌ <span class="review-wrong">${{uAns}}</span><br>✅ <span class="review-right">${{q.aStr}}</span></div>`;
-                list.appendChild(item);
-            }}
-        }});
-        if(wrong===0) list.innerHTML = "<p style='color:green; margin-top:10px;'>🎉 全对！太棒了！</p>";
+        list.style.display = reviewRows.length ? 'block' : 'none';
+        document.getElementById('review-spacer').style.height = `${{reviewRows.length * REVIEW_ROW_H}}px`;
+        document.getElementById('review-empty').innerHTML = reviewRows.length ? "" : "<p style='color:green; margin-top:10px;'>🎉 全对！太棒了！</p>";
         
         document.getElementById('review-modal').style.display = 'flex';
+        list.scrollTop = 0;
+        renderReviewWindow();
+    }}
+
+    // 虚拟列表：只为可视区上下各留 5 行的错题生成 DOM
+    function renderReviewWindow() {{
+        let list = document.getElementById('review-list');
+        let first = Math.max(0, Math.floor(list.scrollTop / REVIEW_ROW_H) - 5);
+        let last = Math.min(reviewRows.length, Math.ceil((list.scrollTop + list.clientHeight) / REVIEW_ROW_H) + 5);
+        let win = document.getElementById('review-window');
+        win.style.transform = `translateY(${{first * REVIEW_ROW_H}}px)`;
+        win.innerHTML = reviewRows.slice(first, last).map(i => {{
+            let q = gameState.questions[i];
+            let uAns = q.userAnswer ? q.userAnswer : "未作答";
+            return `<div class="review-item"><div>${{i+1}}. ${{q.qStr}}</div><div style="font-size:0.9em">❌ <span class="review-wrong">${{uAns}}</span></div><div style="font-size:0.9em">✅ <span class="review-right">${{q.aStr}}</span></div></div>`;
+        }}).join("");
+    }}
+
+    let reviewScrollPending = false;
+    function onReviewScroll() {{
+        if(reviewScrollPending) return;
+        reviewScrollPending = true;
+        requestAnimationFrame(() => {{ reviewScrollPending = false; renderReviewWindow(); }});
     }}
     
     function closeModal() {{ document.getElementById('review-modal').style.display = 'none'; }}
     
+    document.getElementById('review-list').addEventListener('scroll', onReviewScroll);
+    document.addEventListener('visibilitychange', () => {{ if(document.hidden) flushTelemetry(); }});
+    window.addEventListener('pagehide', () => flushTelemetry());
     initGame();
 </script>
 </body>
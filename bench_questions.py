@@ -0,0 +1,131 @@
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+from poem_index import build_char_index, line_id
+from question_gen import BLANK, MODES, N_DISTRACTORS, QuestionGenerator
+
+# ==========================================
+# 出题器正确性 / 吞吐量检验
+# ==========================================
+# 用真实 app_data.json 反复出题，检查：
+#   - 每套题是否凑满、套内是否有重复题
+#   - 每题是否恰好四个互不相同的选项、答案下标是否正确
+#   - 填字题挖空后能否还原出原句
+#   - 接句题在各相邻句对上的分布是否均匀（卡方检验）
+# 并报告每秒出题数与单套出题耗时。任何一项不通过时以非零状态退出。
+#
+#   python bench_questions.py --packs 2000 --size 30
+
+
+def check_question(gen, q, errors):
+    opts = q["options"]
+    if len(opts) != N_DISTRACTORS + 1 or len(set(opts)) != len(opts):
+        errors["选项数量不对或有重复"] += 1
+    if opts[q["answerIdx"]] != q["aStr"]:
+        errors["答案下标错误"] += 1
+    if q["qStr"] in opts:
+        errors["题干出现在选项中"] += 1
+    if q["kind"] == "fill":
+        restored = q["qStr"].replace(BLANK, q["aStr"])
+        poem = {"名字": q["title"], "作者": q["author"]}
+        if q["qStr"].count(BLANK) != 1 or line_id(poem, restored) != q["lineId"]:
+            errors["填字题无法还原原句"] += 1
+
+
+def pair_groups(gen):
+    """
+    (题型, 句子ID) -> 能出这道题的相邻句对数。
+    句子ID按文字生成，同一首诗里的重复句会落到同一个ID上，检验时按句对数加权。
+    """
+    groups = Counter()
+    for pid, i in gen.pairs:
+        poem, ls = gen.poems[pid], gen.lines[pid]
+        groups[("next", line_id(poem, ls[i]))] += 1
+        groups[("prev", line_id(poem, ls[i + 1]))] += 1
+    return groups
+
+
+def pair_uniformity(gen, pair_counts):
+    """接句题落在各相邻句对上的卡方统计量，返回 (卡方, 自由度, 标准化偏差 z, 单对最多/最少)"""
+    groups = pair_groups(gen)
+    total = sum(pair_counts.values())
+    per_pair = total / (2 * len(gen.pairs))  # 上句、下句各占一半
+    chi2 = sum((pair_counts.get(g, 0) - per_pair * w) ** 2 / (per_pair * w) for g, w in groups.items())
+    dof = len(groups) - 1
+    z = (chi2 - dof) / math.sqrt(2 * dof)
+    counts = [pair_counts.get(g, 0) / w for g, w in groups.items()]
+    return chi2, dof, z, max(counts), min(counts)
+
+
+def run(poems, packs, size, mode, seed):
+    char_index = build_char_index(poems)
+    gen = QuestionGenerator(poems, char_index, rng=random.Random(seed))
+
+    errors = Counter()
+    pair_counts = Counter()
+    latencies = []
+    n_questions = 0
+    t_start = time.perf_counter()
+    for _ in range(packs):
+        t0 = time.perf_counter()
+        pack = gen.make_pack(size, mode)
+        latencies.append(time.perf_counter() - t0)
+
+        n_questions += len(pack)
+        if len(pack) < size:
+            errors["整套题未凑满"] += 1
+        # 玩家眼里的“重复题”：同一题型下题干文字相同（不同诗里的同一句也算）
+        keys = [(q["kind"], q["qStr"]) for q in pack]
+        if len(set(keys)) != len(keys):
+            errors["套内有重复题"] += 1
+        for q in pack:
+            check_question(gen, q, errors)
+            if q["kind"] != "fill":
+                pair_counts[(q["kind"], q["lineId"])] += 1
+    elapsed = time.perf_counter() - t_start
+
+    latencies.sort()
+    print(f"[{mode}] {packs} 套 × {size} 题，共 {n_questions} 题，耗时 {elapsed:.2f}s")
+    print(f"  吞吐量: {n_questions / elapsed:,.0f} 题/秒")
+    print(f"  单套耗时: p50 {latencies[len(latencies) // 2] * 1000:.2f}ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms  max {latencies[-1] * 1000:.2f}ms")
+
+    ok = not errors
+    if pair_counts:
+        chi2, dof, z, hi, lo = pair_uniformity(gen, pair_counts)
+        print(f"  句对均匀性: χ²={chi2:.0f} (自由度 {dof}, z={z:+.2f})  单对最多 {hi:.0f} 次 / 最少 {lo:.0f} 次")
+        # 样本量足够时 z 应接近 0；明显偏大说明抽样偏向某些诗或句对
+        if z > 5:
+            errors["句对分布不均匀"] += 1
+            ok = False
+    for msg, n in errors.items():
+        print(f"  ✗ {msg}: {n}")
+    if ok:
+        print("  ✓ 全部检查通过")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出题器正确性与吞吐量检验")
+    parser.add_argument("--data", default="app_data.json")
+    parser.add_argument("--packs", type=int, default=2000, help="每种题型生成的套数")
+    parser.add_argument("--size", type=int, default=30, help="每套题量")
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--seed", type=int, default=2024)
+    args = parser.parse_args()
+
+    with open(args.data, 'r', encoding='utf-8') as f:
+        poems = json.load(f)
+
+    modes = MODES if args.mode == "all" else (args.mode,)
+    results = [run(poems, args.packs, args.size, m, args.seed) for m in modes]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import json
+
+import streamlit as st
+
+from pack_pool import PackPool
+from poem_index import build_char_index
+from question_gen import QuestionGenerator
+
+# ==========================================
+# 题库与出题资源（进程内共享，文件变动时随 mtime 失效，只保留最新一份）
+# ==========================================
+DATA_FILE = 'app_data.json'
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def load_corpus(path, mtime):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def load_char_index(path, mtime):
+    # 字频/字位索引基于完整题库构建
+    return build_char_index(load_corpus(path, mtime))
+
+
+@st.cache_resource(show_spinner=False)
+def _pack_pool():
+    return PackPool()
+
+
+def get_pack_pool(path, mtime):
+    # 全进程一个池子：题库文件变动时只换出题器，不再另起补货线程
+    pool = _pack_pool()
+    pool.use_source((path, mtime), lambda: QuestionGenerator(load_corpus(path, mtime), load_char_index(path, mtime)))
+    return pool
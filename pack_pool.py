@@ -0,0 +1,152 @@
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+
+# ==========================================
+# 预生成题包池
+# ==========================================
+# 后台线程按 (题型, 题量) 各备若干套现成的题，开局时直接取走一套；
+# 池子深度随最近的开局频率伸缩：备足未来 REFILL_HORIZON_S 秒的用量，
+# 并限制在 [MIN_DEPTH, MAX_DEPTH] 之间。
+
+RATE_WINDOW_S = 300      # 用最近 5 分钟的开局次数估算频率
+REFILL_HORIZON_S = 60
+MIN_DEPTH = 2
+MAX_DEPTH = 50
+ERROR_BACKOFF_S = 5     # 出题出错后隔一会儿再试
+
+logger = logging.getLogger(__name__)
+
+
+class PackPool:
+    def __init__(self, generator=None, prewarm=(("jieju", 30),)):
+        self.generator = generator
+        self.source = None
+        self._version = 0                    # 每换一次出题器加一，丢弃旧出题器补出的货
+        self._gen_lock = threading.Lock()   # 出题器的随机数状态不跨线程共享
+        self._cond = threading.Condition()
+        self._packs = defaultdict(deque)     # (mode, n) -> deque[pack]
+        self._takes = defaultdict(deque)     # (mode, n) -> 最近的开局时刻
+        self._refills = deque()              # 最近的补货时刻
+        self._stopped = False
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        for key in prewarm:
+            self._packs[key]
+        self._worker = threading.Thread(target=self._run, name="pack-pool", daemon=True)
+        self._worker.start()
+
+    def use_source(self, source, make_generator):
+        """
+        题库来源（如文件路径+mtime）变化时换上新的出题器并清空旧库存；
+        来源未变则什么也不做。整个进程只保留一个池子和一个补货线程。
+        """
+        if source == self.source:
+            return
+        generator = make_generator()
+        with self._gen_lock, self._cond:
+            if source == self.source:
+                return
+            self.generator = generator
+            self.source = source
+            self._version += 1
+            for queue in self._packs.values():
+                queue.clear()
+            self._cond.notify()
+
+    def close(self):
+        """停止后台补货线程"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._worker.join(timeout=ERROR_BACKOFF_S)
+
+    def _make(self, key):
+        mode, n = key
+        with self._gen_lock:
+            return self.generator.make_pack(n, mode), self._version
+
+    @staticmethod
+    def _trim(times, now, window):
+        while times and now - times[0] > window:
+            times.popleft()
+
+    def target_depth(self, key, now=None):
+        """按最近开局频率估算该组合应备的套数（调用方需持有 _cond）"""
+        times = self._takes[key]
+        self._trim(times, now or time.time(), RATE_WINDOW_S)
+        want = math.ceil(len(times) * REFILL_HORIZON_S / RATE_WINDOW_S)
+        return min(max(want, MIN_DEPTH), MAX_DEPTH)
+
+    def take(self, n, mode="jieju"):
+        """取走一套题；池中没有现货时当场生成，并唤醒后台补货"""
+        key = (mode, n)
+        with self._cond:
+            self._takes[key].append(time.time())
+            queue = self._packs[key]
+            pack = queue.popleft() if queue else None
+            if pack is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._cond.notify()
+        return pack if pack is not None else self._make(key)[0]
+
+    def _next_short(self):
+        """找出当前缺货最多的组合，没有缺货或尚无出题器时返回 None（调用方需持有 _cond）"""
+        if self.generator is None:
+            return None
+        now = time.time()
+        best, best_gap = None, 0
+        for key, queue in self._packs.items():
+            gap = self.target_depth(key, now) - len(queue)
+            if gap > best_gap:
+                best, best_gap = key, gap
+        return best
+
+    def _run(self):
+        while True:
+            with self._cond:
+                key = self._next_short()
+                while key is None and not self._stopped:
+                    self._cond.wait(timeout=5)
+                    key = self._next_short()
+                if self._stopped:
+                    return
+            try:
+                pack, version = self._make(key)
+            except Exception:
+                # 补货线程不能因一次出题失败而退出，记下错误、稍后重试
+                logger.exception("题包池补货失败: %s", key)
+                with self._cond:
+                    self.errors += 1
+                    self._cond.wait(timeout=ERROR_BACKOFF_S)
+                continue
+            with self._cond:
+                if version == self._version:
+                    self._packs[key].append(pack)
+                    self._refills.append(time.time())
+
+    def stats(self):
+        """池子现状：各组合库存/目标、补货速率、开局频率与命中率"""
+        with self._cond:
+            now = time.time()
+            self._trim(self._refills, now, 60)
+            pools = {
+                f"{mode}×{n}": {"depth": len(q), "target": self.target_depth((mode, n), now)}
+                for (mode, n), q in self._packs.items()
+            }
+            logins = sum(len(t) for t in self._takes.values())
+            return {
+                "depth": sum(p["depth"] for p in pools.values()),
+                "refill_per_min": len(self._refills),
+                "logins_per_min": logins * 60 / RATE_WINDOW_S,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "alive": self._worker.is_alive(),
+                "pools": pools,
+            }
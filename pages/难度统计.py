@@ -0,0 +1,69 @@
+import os
+
+import streamlit as st
+
+from game_data import DATA_FILE, get_pack_pool, load_corpus
+from poem_index import get_poem_lines, line_id
+from session_store import get_session_store
+from telemetry import get_store
+
+st.set_page_config(page_title="难度统计", layout="wide", page_icon="📊")
+
+# ==========================================
+# 逐句难度统计（只读聚合结果，不回扫原始事件）
+# ==========================================
+@st.cache_data(show_spinner=False, max_entries=1)
+def load_line_lookup(path, mtime):
+    """句子ID -> (诗句, 诗名, 作者)"""
+    return {
+        line_id(poem, line): (line, poem.get("名字", ""), poem.get("作者", ""))
+        for poem in load_corpus(path, mtime) for line in get_poem_lines(poem)
+    }
+
+
+st.title("📊 诗句难度榜")
+
+total_events, line_stats = get_store().snapshot()
+lookup = load_line_lookup(DATA_FILE, os.path.getmtime(DATA_FILE)) if os.path.exists(DATA_FILE) else {}
+
+min_n = st.slider("最少作答次数", 1, 20, 3)
+rows = []
+for lid, (n, miss, ms) in line_stats.items():
+    if n < min_n:
+        continue
+    text, title, author = lookup.get(lid, (lid, "", ""))
+    rows.append({
+        "诗句": text, "出处": f"{author}《{title}》" if title else "",
+        "作答次数": n, "错误率": round(miss / n, 3), "平均用时(秒)": round(ms / n / 1000, 1),
+    })
+rows.sort(key=lambda r: (r["错误率"], r["平均用时(秒)"]), reverse=True)
+
+c1, c2 = st.columns(2)
+c1.metric("累计答题", total_events)
+c2.metric("已统计诗句", len(line_stats))
+
+if rows:
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+else:
+    st.info("暂无足够的答题数据。")
+
+if os.path.exists(DATA_FILE):
+    st.subheader("🗃️ 题包池")
+    pool = get_pack_pool(DATA_FILE, os.path.getmtime(DATA_FILE)).stats()
+    p1, p2, p3, p4 = st.columns(4)
+    p1.metric("库存套数", pool["depth"])
+    p2.metric("补货速率(套/分)", pool["refill_per_min"])
+    p3.metric("开局频率(次/分)", round(pool["logins_per_min"], 1))
+    p4.metric("命中 / 未命中", f'{pool["hits"]} / {pool["misses"]}')
+    if pool["errors"] or not pool["alive"]:
+        st.warning(f'补货出错 {pool["errors"]} 次' + ("" if pool["alive"] else "，补货线程已停止"))
+    st.dataframe([{"题型×题量": k, "库存": v["depth"], "目标": v["target"]} for k, v in pool["pools"].items()],
+                 use_container_width=True, hide_index=True)
+
+st.subheader("🧹 会话")
+sess = get_session_store().stats()
+s1, s2, s3, s4 = st.columns(4)
+s1.metric("在线会话", sess["live"], help=f'其中答题中 {sess["in_game"]} 个')
+s2.metric("空闲回收", sess["reaped_idle"])
+s3.metric("断线回收", sess["reaped_gone"])
+s4.metric("会话数据(KB)", round(sess["bytes"] / 1024, 1), help=f'单会话最大 {sess["max_bytes"] / 1024:.1f} KB')
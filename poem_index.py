@@ -0,0 +1,68 @@
+import hashlib
+import re
+from collections import Counter, defaultdict
+
+# ==========================================
+# 诗句字频 / 字位索引
+# ==========================================
+# 填字题的干扰字按“同句长、同字位”查表抽取，
+# 索引在载入题库时一次性建好，出题时不再遍历全库。
+
+MAX_LINES = 20
+CLAUSE_SPLIT = re.compile(r"[，。？！；：、,.?!;:\s]+")
+
+
+def get_poem_lines(poem):
+    """取出一首诗中所有非空诗句（content_1 … content_20，按原顺序）"""
+    lines = []
+    for i in range(1, MAX_LINES + 1):
+        c = poem.get(f"content_{i}")
+        if c and c.strip():
+            lines.append(c)
+    return lines
+
+
+def line_id(poem, line):
+    """按诗名、作者与诗句文字生成句子ID，题库增删、调序后同一句的ID不变"""
+    key = "\x1f".join((poem.get("名字", ""), poem.get("作者", ""), line))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def split_clauses(line):
+    """按标点把一行拆成分句，如 “床前明月光，疑是地上霜。” -> ["床前明月光", "疑是地上霜"]"""
+    return [c for c in CLAUSE_SPLIT.split(line) if c]
+
+
+def slot_key(clause_len, pos):
+    """字位键：分句长度-字序，如五言第三字为 "5-2" """
+    return f"{clause_len}-{pos}"
+
+
+def build_char_index(poems):
+    """
+    统计全部诗句的字频与字位分布。
+
+    返回:
+        {
+            "freq":  {字: 全库出现次数},
+            "slots": {字位键: 该字位上出现过的字（按出现次数降序拼成的字符串）},
+            "lines": 参与统计的诗句数,
+        }
+    """
+    freq = Counter()
+    slots = defaultdict(Counter)
+    n_lines = 0
+    for poem in poems:
+        for line in get_poem_lines(poem):
+            n_lines += 1
+            for clause in split_clauses(line):
+                n = len(clause)
+                for pos, ch in enumerate(clause):
+                    freq[ch] += 1
+                    slots[slot_key(n, pos)][ch] += 1
+
+    return {
+        "freq": dict(freq),
+        "slots": {k: "".join(ch for ch, _ in c.most_common()) for k, c in slots.items()},
+        "lines": n_lines,
+    }
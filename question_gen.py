@@ -0,0 +1,157 @@
+import random
+
+from poem_index import get_poem_lines, line_id, slot_key, split_clauses, CLAUSE_SPLIT
+
+# ==========================================
+# 服务端出题
+# ==========================================
+# 接句题按“相邻两句”均匀抽样（每对句子被问到的概率相同，与诗的长短无关），
+# 填字题按“可挖空的诗句”均匀抽样；同一套题内不出重复题，
+# 凑不满三个干扰项的题直接换一道，保证每题恰好四个选项。
+
+BLANK = "□"
+DIST_WINDOW = 20   # 干扰字取自同字位、字频排名相近的 ±20 名内
+N_DISTRACTORS = 3
+MODES = ("jieju", "tianzi", "mixed")
+
+
+class QuestionGenerator:
+    def __init__(self, poems, char_index, rng=None):
+        self.poems = poems
+        self.rng = rng or random.Random()
+        self.lines = [get_poem_lines(p) for p in poems]
+
+        # 接句：所有相邻句对 (诗序号, 上句序号)
+        self.pairs = [(pid, i) for pid, ls in enumerate(self.lines) for i in range(len(ls) - 1)]
+        # 接句干扰项：各诗首句（去重），与原前端的取法一致；
+        # 题库太小（如内置示例数据）首句不够用时，退而用全部诗句
+        self.line_pool = list(dict.fromkeys(ls[0] for ls in self.lines if len(ls) >= 2))
+        if len(self.line_pool) < N_DISTRACTORS + 2:
+            self.line_pool = list(dict.fromkeys(line for ls in self.lines for line in ls))
+        # 填字：含四字及以上分句的诗句 (诗序号, 句序号)
+        self.fill_lines = [
+            (pid, i) for pid, ls in enumerate(self.lines) if len(ls) >= 2
+            for i, line in enumerate(ls) if any(len(c) >= 4 for c in split_clauses(line))
+        ]
+
+        self.slot_chars = {k: list(v) for k, v in char_index["slots"].items()}
+        self.slot_rank = {k: {ch: i for i, ch in enumerate(v)} for k, v in self.slot_chars.items()}
+        # 同字位凑不满干扰字时的兜底：全库用字
+        self.all_chars = sorted(char_index["freq"], key=char_index["freq"].get, reverse=True)
+
+    # ---------- 单题 ----------
+
+    def _meta(self, pid, lidx, kind, q_str, a_str, hint, dists):
+        options = dists + [a_str]
+        self.rng.shuffle(options)
+        poem = self.poems[pid]
+        return {
+            "lineId": line_id(poem, self.lines[pid][lidx]), "kind": kind,
+            "qStr": q_str, "aStr": a_str, "hint": hint,
+            "options": options, "answerIdx": options.index(a_str),
+            "title": poem.get("名字", ""), "author": poem.get("作者", ""), "dynasty": poem.get("朝代", ""),
+        }
+
+    def line_distractors(self, a_str, q_str):
+        pool, dists = self.line_pool, []
+        # 题库远大于 3，先随机试几次；运气不好再整体洗牌兜底
+        for _ in range(10):
+            line = pool[self.rng.randrange(len(pool))]
+            if line != a_str and line != q_str and line not in dists:
+                dists.append(line)
+                if len(dists) == N_DISTRACTORS:
+                    return dists
+        for line in self.rng.sample(pool, len(pool)):
+            if line != a_str and line != q_str and line not in dists:
+                dists.append(line)
+                if len(dists) == N_DISTRACTORS:
+                    break
+        return dists
+
+    def char_distractors(self, key, ans, line):
+        chars = self.slot_chars.get(key, [])
+        rank = self.slot_rank.get(key, {}).get(ans, 0)
+        dists = []
+        w = DIST_WINDOW
+        while len(dists) < N_DISTRACTORS and w <= len(chars) * 2:
+            lo, hi = max(0, rank - w), min(len(chars), rank + w + 1)
+            for _ in range(30):
+                ch = chars[self.rng.randrange(lo, hi)]
+                if ch != ans and ch not in line and ch not in dists:
+                    dists.append(ch)
+                    if len(dists) == N_DISTRACTORS:
+                        break
+            w *= 2
+        if len(dists) < N_DISTRACTORS:
+            for ch in self.rng.sample(self.all_chars, len(self.all_chars)):
+                if ch != ans and ch not in line and ch not in dists:
+                    dists.append(ch)
+                    if len(dists) == N_DISTRACTORS:
+                        break
+        return dists
+
+    def make_line_question(self):
+        pid, i = self.pairs[self.rng.randrange(len(self.pairs))]
+        ls = self.lines[pid]
+        if self.rng.random() < 0.5:
+            lidx, a_str, kind, hint = i, ls[i + 1], "next", "选下一句"
+        else:
+            lidx, a_str, kind, hint = i + 1, ls[i], "prev", "选上一句"
+        q_str = ls[lidx]
+        dists = self.line_distractors(a_str, q_str)
+        if len(dists) < N_DISTRACTORS:
+            return None
+        return self._meta(pid, lidx, kind, q_str, a_str, hint, dists)
+
+    def make_fill_question(self):
+        pid, lidx = self.fill_lines[self.rng.randrange(len(self.fill_lines))]
+        line = self.lines[pid][lidx]
+        chars = list(line)
+        slots, clause = [], []
+        for i, ch in enumerate(chars + [" "]):
+            if CLAUSE_SPLIT.match(ch):
+                if len(clause) >= 4:
+                    slots.extend((j, slot_key(len(clause), p)) for p, j in enumerate(clause))
+                clause = []
+            else:
+                clause.append(i)
+
+        i, key = slots[self.rng.randrange(len(slots))]
+        ans = chars[i]
+        dists = self.char_distractors(key, ans, line)
+        if len(dists) < N_DISTRACTORS:
+            return None
+        chars[i] = BLANK
+        return self._meta(pid, lidx, "fill", "".join(chars), ans, "选填空字", dists)
+
+    # ---------- 整套 ----------
+
+    @staticmethod
+    def _line_text(q):
+        return q["qStr"].replace(BLANK, q["aStr"])
+
+    def make_pack(self, n, mode="jieju"):
+        """生成一套 n 道不重复的题；题库太小时可能不足 n 道"""
+        use_line = mode != "tianzi" and bool(self.pairs)
+        use_fill = mode != "jieju" and bool(self.fill_lines)
+        if not (use_line or use_fill):
+            return []
+
+        pack, seen = [], set()
+        for _ in range(n * 100):
+            if len(pack) >= n:
+                break
+            fill = use_fill and (not use_line or self.rng.random() < 0.5)
+            q = self.make_fill_question() if fill else self.make_line_question()
+            if q is None:
+                continue
+            # 按文字去重：题干相同即算重复（不同诗中的相同诗句、只差所挖一字的两句也算），
+            # 填字题另按原句去重，同一句只挖一次
+            keys = [(q["kind"], q["qStr"])]
+            if fill:
+                keys.append(("line", self._line_text(q)))
+            if any(k in seen for k in keys):
+                continue
+            seen.update(keys)
+            pack.append(q)
+        return pack
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# ==========================================
+# 会话级游戏数据：空闲回收 + 单会话内存上限
+# ==========================================
+# 每局的题包等较大的数据不放进 st.session_state，而是按 session_id 存在这里：
+# 后台线程定期清掉空闲超时的会话——已交卷或还没开局的按 SESSION_TTL_S，
+# 仍在答题中的按更长的 SESSION_ACTIVE_TTL_S；不在答题中、且 Streamlit 已彻底忘掉的会话
+# （断线后超过其重连保留期）再等 GONE_GRACE_S 后提前回收，锁屏、断网后重连的玩家不受影响；
+# 单个会话的数据总量不得超过上限，超出的写入会被拒绝。
+
+SESSION_TTL_S = int(os.environ.get("POETRY_SESSION_TTL", 30 * 60))
+SESSION_ACTIVE_TTL_S = int(os.environ.get("POETRY_SESSION_ACTIVE_TTL", 4 * 60 * 60))
+SESSION_BUDGET_BYTES = int(os.environ.get("POETRY_SESSION_BUDGET", 1024 * 1024))
+SWEEP_INTERVAL_S = 60
+GONE_GRACE_S = 5 * 60            # 长于 Streamlit 断线会话的 2 分钟重连保留期
+MAX_REMEMBERED_REAPED = 10_000   # 记住最近回收的会话，便于玩家回来时提示
+
+
+class _Session:
+    __slots__ = ("last_active", "items", "nbytes", "in_game", "gone_since")
+
+    def __init__(self, now):
+        self.last_active = now
+        self.items = {}              # key -> (value, size)
+        self.nbytes = 0
+        self.in_game = False         # 已开局且未交卷
+        self.gone_since = None       # 首次发现运行时已无此会话的时刻
+
+
+class SessionStore:
+    def __init__(self, ttl_s=SESSION_TTL_S, active_ttl_s=SESSION_ACTIVE_TTL_S,
+                 budget_bytes=SESSION_BUDGET_BYTES, is_known=None):
+        self.ttl_s = ttl_s
+        self.active_ttl_s = active_ttl_s
+        self.budget_bytes = budget_bytes
+        self.is_known = is_known       # sid -> bool，运行时是否还保有该会话（含断线待重连）；None 表示只按 TTL 回收
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._reaped = OrderedDict()   # 最近回收的 sid，仅用于回访提示
+        self.reaped_idle = 0
+        self.reaped_gone = 0
+        self.rejected = 0
+        self._worker = threading.Thread(target=self._run, name="session-reaper", daemon=True)
+        self._worker.start()
+
+    def _session(self, sid):
+        now = time.time()
+        s = self._sessions.get(sid)
+        if s is None:
+            s = self._sessions[sid] = _Session(now)
+        s.last_active = now
+        return s
+
+    def touch(self, sid):
+        """记一次活跃；若该会话此前因空闲被回收过，返回 True（只报告一次）"""
+        with self._lock:
+            self._session(sid)
+            return self._reaped.pop(sid, None) is not None
+
+    def set_in_game(self, sid, in_game):
+        """开局时置为 True，交卷后置为 False；答题中的会话按更长的 TTL 回收"""
+        with self._lock:
+            self._session(sid).in_game = in_game
+
+    def get(self, sid, key, default=None):
+        with self._lock:
+            item = self._session(sid).items.get(key)
+        return item[0] if item else default
+
+    def put(self, sid, key, value, size):
+        """
+        存入一项数据（替换同名旧值），size 为其字节数。
+        替换后本会话总量会超出上限时不保存并返回 False，由调用方把数据裁小后再存。
+        """
+        with self._lock:
+            s = self._session(sid)
+            old = s.items.get(key)
+            if s.nbytes - (old[1] if old else 0) + size > self.budget_bytes:
+                self.rejected += 1
+                return False
+            self._discard(s, key)
+            s.items[key] = (value, size)
+            s.nbytes += size
+            return True
+
+    def discard(self, sid, key):
+        with self._lock:
+            self._discard(self._session(sid), key)
+
+    @staticmethod
+    def _discard(s, key):
+        item = s.items.pop(key, None)
+        if item:
+            s.nbytes -= item[1]
+
+    def reap(self, now=None):
+        """清理空闲超时或已被运行时丢弃的会话，返回本轮清理数"""
+        now = now or time.time()
+        with self._lock:
+            idle = [sid for sid, s in self._sessions.items()
+                    if now - s.last_active > (self.active_ttl_s if s.in_game else self.ttl_s)]
+            for sid in idle:
+                del self._sessions[sid]
+                self._reaped[sid] = now
+            while len(self._reaped) > MAX_REMEMBERED_REAPED:
+                self._reaped.popitem(last=False)
+            # 答题中的会话只按 active_ttl_s 回收，不走下面的断线路径
+            rest = [sid for sid, s in self._sessions.items() if not s.in_game]
+        known = {sid: self.is_known(sid) for sid in rest} if self.is_known else {}
+        with self._lock:
+            gone = []
+            for sid, ok in known.items():
+                s = self._sessions.get(sid)
+                if s is None or s.in_game:
+                    continue
+                if ok:
+                    s.gone_since = None
+                elif s.gone_since is None:
+                    s.gone_since = now
+                elif now - s.gone_since > GONE_GRACE_S:
+                    del self._sessions[sid]
+                    gone.append(sid)
+            self.reaped_idle += len(idle)
+            self.reaped_gone += len(gone)
+        return len(idle) + len(gone)
+
+    def _run(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL_S)
+            self.reap()
+
+    def stats(self):
+        with self._lock:
+            sizes = [s.nbytes for s in self._sessions.values()]
+            return {
+                "live": len(sizes),
+                "in_game": sum(s.in_game for s in self._sessions.values()),
+                "reaped_idle": self.reaped_idle,
+                "reaped_gone": self.reaped_gone,
+                "rejected": self.rejected,
+                "bytes": sum(sizes),
+                "max_bytes": max(sizes, default=0),
+            }
+
+
+def _session_known(sid):
+    """运行时是否还保有该会话：在线，或断线后仍在重连保留期内"""
+    try:
+        from streamlit.runtime import Runtime
+        runtime = Runtime.instance()
+        session_mgr = getattr(runtime, "_session_mgr", None)
+        if session_mgr is not None and hasattr(session_mgr, "get_session_info"):
+            return session_mgr.get_session_info(sid) is not None
+        # 拿不到会话管理器时退回只看在线状态，由 GONE_GRACE_S 兜住重连窗口
+        return runtime.is_active_session(sid)
+    except Exception:
+        return True
+
+
+@st.cache_resource
+def get_session_store():
+    return SessionStore(is_known=_session_known)
+
+
+def current_session_id():
+    return get_script_run_ctx().session_id
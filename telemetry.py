@@ -0,0 +1,184 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+# ==========================================
+# 答题埋点：事件落盘 + 逐句难度统计
+# ==========================================
+# 前端按批上报 [句子ID, 题型, 所选项, 是否答对, 用时ms]，
+# 原始事件追加写入 events-v2.log（制表符分隔，一行一条），是唯一的真实来源；
+# 内存里的聚合由后台线程定期快照到 line_stats-v2.json，快照记下当时日志的字节偏移，
+# 启动时载入快照、再重放偏移之后的日志尾部，中途崩溃也不会让两者对不上。
+# 统计页只读内存中的聚合结果。
+# 文件名带句子ID方案的版本号：v1 按题库中的位置编号，题库一改就对不上，已弃用。
+
+TELEMETRY_DIR = 'telemetry_data'
+LINE_ID_VERSION = 2
+MAX_RESPONSE_MS = 120_000  # 超过 2 分钟视为挂机，按上限计入
+KINDS = ("prev", "next", "fill")
+SNAPSHOT_INTERVAL_S = 30
+
+logger = logging.getLogger(__name__)
+
+_bridge = components.declare_component(
+    "telemetry_bridge",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry_bridge"),
+)
+
+
+def _clean_event(ev):
+    """校验前端上报的单条事件，格式不对返回 None"""
+    try:
+        line_id, kind, choice, correct, ms = ev
+        line_id = str(line_id)
+        if kind not in KINDS or not line_id:
+            return None
+        return line_id, kind, int(choice), 1 if correct else 0, min(max(int(ms), 0), MAX_RESPONSE_MS)
+    except (TypeError, ValueError):
+        return None
+
+
+class TelemetryStore:
+    """
+    逐句难度统计。line_stats 形如 {句子ID: [作答次数, 答错次数, 用时总和ms]}，
+    每批事件到达时只追加日志并更新内存，聚合由后台线程定期快照，无需回扫整个事件日志。
+    """
+
+    def __init__(self, root=TELEMETRY_DIR, snapshot_interval_s=SNAPSHOT_INTERVAL_S):
+        os.makedirs(root, exist_ok=True)
+        self.events_path = os.path.join(root, f'events-v{LINE_ID_VERSION}.log')
+        self.stats_path = os.path.join(root, f'line_stats-v{LINE_ID_VERSION}.json')
+        self.snapshot_interval_s = snapshot_interval_s
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # 快照写盘互斥，不占用 _lock
+        self.total_events = 0
+        self.line_stats = {}
+        self._log_offset = 0                 # 已折叠进聚合的日志字节数
+        self._dirty = False
+        self._load()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="telemetry-snapshot", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def _load(self):
+        """载入快照，再重放快照之后追加的日志尾部"""
+        if os.path.exists(self.stats_path):
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self.total_events = saved.get("total_events", 0)
+            self.line_stats = saved.get("lines", {})
+            self._log_offset = saved.get("log_offset", 0)
+        if not os.path.exists(self.events_path):
+            self.total_events, self.line_stats, self._log_offset = 0, {}, 0
+            return
+        if os.path.getsize(self.events_path) < self._log_offset:
+            # 日志被截断或替换过，快照已不可信，整份重放
+            self.total_events, self.line_stats, self._log_offset = 0, {}, 0
+        with open(self.events_path, 'rb') as f:
+            f.seek(self._log_offset)
+            tail = f.read()
+        end = tail.rfind(b"\n") + 1
+        rows = []
+        for raw in tail[:end].decode('utf-8', errors='replace').splitlines():
+            parts = raw.split("\t")
+            try:
+                _, lid, kind, choice, ok, ms = parts
+                row = _clean_event((lid, kind, choice, int(ok), ms))
+            except ValueError:
+                row = None
+            if row:
+                rows.append(row)
+        self._fold(rows)
+        self._log_offset += end
+        if end < len(tail):
+            # 崩溃时写了半行：截掉，免得和下一批粘在一起
+            with open(self.events_path, 'r+b') as f:
+                f.truncate(self._log_offset)
+        if rows:
+            self._dirty = True
+            logger.info("埋点日志重放 %d 条", len(rows))
+
+    def _fold(self, rows):
+        for lid, kind, choice, ok, ms in rows:
+            s = self.line_stats.setdefault(lid, [0, 0, 0])
+            s[0] += 1
+            s[1] += 1 - ok
+            s[2] += ms
+        self.total_events += len(rows)
+
+    def record_batch(self, events):
+        """追加一批事件并折叠进聚合，返回实际入库条数"""
+        rows = [r for r in map(_clean_event, events or []) if r]
+        if not rows:
+            return 0
+        now = int(time.time())
+        data = "".join(f"{now}\t{lid}\t{kind}\t{choice}\t{ok}\t{ms}\n"
+                       for lid, kind, choice, ok, ms in rows).encode('utf-8')
+        with self._lock:
+            with open(self.events_path, 'ab') as f:
+                f.write(data)
+            self._fold(rows)
+            self._log_offset += len(data)
+            self._dirty = True
+        return len(rows)
+
+    def save(self):
+        """把当前聚合连同对应的日志偏移写成快照（原子替换），没有新事件时跳过"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                saved = {"total_events": self.total_events, "log_offset": self._log_offset,
+                         "lines": {k: list(v) for k, v in self.line_stats.items()}}
+                self._dirty = False
+            tmp = self.stats_path + '.tmp'
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(saved, f, ensure_ascii=False)
+                os.replace(tmp, self.stats_path)
+            except OSError:
+                logger.exception("埋点快照写入失败")
+                with self._lock:
+                    self._dirty = True
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval_s):
+            self.save()
+
+    def close(self):
+        """停止快照线程并补写最后一次快照"""
+        self._stop.set()
+        self.save()
+
+    def snapshot(self):
+        with self._lock:
+            return self.total_events, {k: list(v) for k, v in self.line_stats.items()}
+
+
+@st.cache_resource
+def get_store():
+    return TelemetryStore()
+
+
+def collect_answers(key="telemetry"):
+    """
+    渲染不可见的上报桥接组件，并把新到的一批事件写入统计。
+    组件值在之后的 rerun 中会保持不变，只需记住上一批的批次号即可去重；
+    返回本次新到的批次（含 restart / finished 等附带标记），没有则返回 None。
+    """
+    batch = _bridge(key=key, default=None)
+    if not batch or not isinstance(batch, dict):
+        return None
+    batch_id = batch.get("id")
+    if st.session_state.get('_telemetry_last_batch') == batch_id:
+        return None
+    st.session_state._telemetry_last_batch = batch_id
+    get_store().record_batch(batch.get("events"))
+    return batch